@@ -1,6 +1,13 @@
 import tkinter as tk
 from tkinter import ttk
-import numpy as np
+import random
+import os
+import time
+import sys
+import pickle
+from array import array
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from threading import Thread
 from queue import Queue
 
@@ -12,11 +19,158 @@ player_type = ['human']
 for i in range(42):
     player_type.append('AI: alpha-beta level '+str(i+1))
 
+# Bitboard layout: each column uses 7 bits (6 boxs + 1 empty sentinel bit on
+# top so that alignments cannot wrap from one column to the next), the bit of
+# the box (column, row) being column * 7 + row with row 0 at the bottom
+BOTTOM_MASK = sum(1 << (column * 7) for column in range(7))
+BOARD_MASK = BOTTOM_MASK * 0b111111
+COLUMN_MASKS = tuple(0b111111 << (column * 7) for column in range(7))
+CENTER_OUT_COLUMNS = (3, 4, 2, 5, 1, 6, 0)
+
+# Every set of 4 aligned boxs (horizontal, vertical and both diagonals)
+WINDOW_MASKS = tuple(
+    sum(1 << ((column + i * d_column) * 7 + row + i * d_row)
+        for i in range(4))
+    for column in range(7)
+    for row in range(6)
+    for d_column, d_row in ((1, 0), (0, 1), (1, 1), (1, -1))
+    if 0 <= column + 3 * d_column < 7 and 0 <= row + 3 * d_row < 6)
+# Sets of 4 aligned boxs going through each box, indexed by the box's bit
+WINDOWS_BY_BOX = tuple(tuple(window for window in WINDOW_MASKS
+                             if window >> box & 1)
+                       for box in range(49))
+
+# Evaluation table for the central positioning of pawns, split in bit planes
+# (weight 2^k, bitboard of the boxs whose value has its bit k set) so that
+# the positioning score only takes 4 popcounts per player
+evaluation_table = (
+    (3, 4, 5, 7, 5, 4, 3),
+    (4, 6, 8, 10, 8, 6, 4),
+    (5, 8, 11, 13, 11, 8, 5),
+    (5, 8, 11, 13, 11, 8, 5),
+    (4, 6, 8, 10, 8, 6, 4),
+    (3, 4, 5, 7, 5, 4, 3)
+)
+CENTRAL_MASKS = tuple(
+    (1 << k, sum(1 << (column * 7 + row)
+                 for row in range(6) for column in range(7)
+                 if evaluation_table[row][column] >> k & 1))
+    for k in range(max(map(max, evaluation_table)).bit_length()))
+
+
+def generate_eval_function():
+    """
+    Generates the evaluation function of the bitboards, with the loops over
+    the directions, the players and the central masks unrolled and every
+    shift and mask written as a constant.
+    The windows are evaluated all at once: each set of 4 aligned boxs is
+    represented by the bit of its first box, so that shifting the bitboards
+    aligns the 4 boxs of all the windows of a direction.
+    :return: A function (player_disks, opponent_disks, free_boxs) -> score
+    of the board for the player
+    """
+    source = ['def eval_bitboards(player_disks, opponent_disks, free_boxs):',
+              '    score = 0']
+    # -> Main evaluation criteria : the AI is encouraged to line up 4
+    # pawns or 3 pawns and an empty square (and prevent the opponent from
+    # doing the same)
+    for shift in (7, 1, 8, 6):
+        source += ['    free_1 = free_boxs >> %d' % shift,
+                   '    free_2 = free_boxs >> %d' % (2 * shift),
+                   '    free_3 = free_boxs >> %d' % (3 * shift)]
+        for disks_name, sign in (('player_disks', '+'),
+                                 ('opponent_disks', '-')):
+            source += [
+                '    disks_1 = %s >> %d' % (disks_name, shift),
+                '    disks_23 = (%s >> %d) & (%s >> %d)'
+                % (disks_name, 2 * shift, disks_name, 3 * shift),
+                '    disks_01 = %s & disks_1' % disks_name,
+                # Victory -> must be high so that it cannot be overtaken by
+                # another no-win combination, or one pawn until victory
+                '    score %s= (10000 * (disks_01 & disks_23).bit_count()'
+                % sign,
+                '        + 20 * ((free_boxs & disks_1 & disks_23)',
+                '                | (%s & free_1 & disks_23)' % disks_name,
+                '                | (disks_01 & free_2 & (%s >> %d))'
+                % (disks_name, 3 * shift),
+                '                | (disks_01 & (%s >> %d) & free_3)'
+                % (disks_name, 2 * shift),
+                '                ).bit_count())']
+    # -> Then, to help decide between 2 moves who give the same number of
+    # alignments, we encourage central positioning (more chance to align
+    # pawns)
+    for weight, cells in CENTRAL_MASKS:
+        source.append('    score += %d * ((player_disks & %d).bit_count()'
+                      ' - (opponent_disks & %d).bit_count())'
+                      % (weight, cells, cells))
+    source.append('    return score')
+    namespace = dict()
+    exec('\n'.join(source), namespace)
+    return namespace['eval_bitboards']
+
+
+eval_bitboards = generate_eval_function()
+
+# Zobrist keys: one random 64-bit number per (player, box), the hash of a
+# board being the XOR of the keys of its disks (seeded so that hashes are the
+# same from one run to the next)
+zobrist_generator = random.Random(4)
+ZOBRIST = tuple(tuple(zobrist_generator.getrandbits(64) for _ in range(49))
+                for _ in range(2))
+# Bit of the box symmetric to each box (column <-> 6 - column)
+MIRROR_BOXES = tuple((6 - box // 7) * 7 + box % 7 for box in range(49))
+
+# Transposition table: entries (depth, flag, value, best_move), values being
+# given for the player whose turn it is, kept from one turn to the next.
+# Symmetric boards share the same entry: the key is the smallest of the hash
+# and the mirror hash, and best moves are stored for the board of the key.
+# Entries are packed in 64-bit ints (value + 2^31 on 32 bits | best move on
+# 4 bits | flag on 2 bits | depth on 6 bits) in fixed-size arrays: each
+# bucket (key & (TT_BUCKETS - 1)) has a slot keeping the deepest search and
+# a slot keeping the last one
+EXACT, LOWER_BOUND, UPPER_BOUND = 1, 2, 3
+NO_MOVE = 15
+TT_BUCKETS = 1 << 19
+tt_keys = array('Q', [0]) * (2 * TT_BUCKETS)
+tt_entries = array('Q', [0]) * (2 * TT_BUCKETS)
+
+# Move ordering heuristics: history[player - 1][column] grows each time
+# playing column caused a cutoff, killer_moves[number of disks] is the last
+# move which caused a cutoff with this number of disks on the board
+history = [[0] * 7, [0] * 7]
+killer_moves = [None] * 43
+
+# Half width of the aspiration window around the previous depth's score
+ASPIRATION_WINDOW = 30
+
+# Root-parallel search: the last depth of a search is split between processes
+# only if the previous depth took at least PARALLEL_MIN_TIME seconds (the
+# processes cost tens of milliseconds per search, and their pool is created
+# on the first parallel search). Below that, the serial search is faster
+PARALLEL_MIN_TIME = 2
+search_workers = min(7, os.cpu_count() or 1)
+search_pool = None
+
+# Opening book: key -> best move (for the board of the key) of every board
+# with less than BOOK_DISKS disks, searched at depth BOOK_DEPTH. It is built
+# by running this file with --build-book and loaded when the game starts.
+# It is used from level BOOK_MIN_LEVEL to level BOOK_DEPTH: lower levels keep
+# their weaker search, higher levels search deeper than the book
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                         'book.pkl')
+BOOK_DEPTH = 12
+BOOK_DISKS = 4
+BOOK_MIN_LEVEL = 7
+opening_book = dict()
+
 
 def alpha_beta_decision(board, turn, ai_level, queue, max_player):
     """
     Chooses the best move for the maximizing player based on the depth
     of AI's calculation (ai_level) and places the move in the queue.
+    The search is iteratively deepened: the best move found at each depth is
+    explored first at the next one, and its score narrows the window of the
+    next one, which makes the pruning more efficient.
     :param board: The game board in its current state
     :param turn: Current turn number
     :param ai_level: Maximum depth for the AI search
@@ -24,94 +178,350 @@ def alpha_beta_decision(board, turn, ai_level, queue, max_player):
     :param max_player: The player trying to maximize their score
     :return: None
     """
-    _, best_move = alpha_beta(board, turn, ai_level, float('-inf'),
-                              float('inf'), max_player, True)
+    if BOOK_MIN_LEVEL <= ai_level <= BOOK_DEPTH:  # The opening book is at
+        # least as deep as the AI's search -> we play its move if the board
+        # is in it
+        key = min(board.hash, board.mirror_hash)
+        move = opening_book.get(key)
+        if move is not None:
+            queue.put(move if key == board.hash else 6 - move)
+            return
+
+    board = board.copy()  # The search plays and undoes moves on its board
+    best_move = None
+    value = None
+    search_time = 0
+    for depth in range(1, ai_level + 1):
+        parallel = (depth == ai_level and search_workers > 1
+                    and search_time >= PARALLEL_MIN_TIME)
+        search_start = time.perf_counter()
+        # The score rarely changes much from one depth to the next -> we
+        # first search a narrow window around the previous score, and only
+        # search again with the full window if the score is outside of it
+        windows = [(float('-inf'), float('inf'))]
+        if value is not None:
+            windows.insert(0, (value - ASPIRATION_WINDOW,
+                               value + ASPIRATION_WINDOW))
+        for alpha, beta in windows:
+            if parallel:
+                value, move = root_parallel_search(board, depth, alpha, beta,
+                                                   max_player, best_move)
+            else:
+                value, move = negamax(board, depth, alpha, beta, max_player,
+                                      best_move)
+            if alpha < value < beta:
+                break
+        best_move = move
+        search_time = time.perf_counter() - search_start
     queue.put(best_move)
 
 
-def alpha_beta(board, turn, depth, alpha, beta, current_player,
-               maximizing_player):
+def build_opening_book():
+    """
+    Searches the best move of every board with less than BOOK_DISKS disks
+    (symmetric boards and transpositions being searched once) and saves the
+    opening book in BOOK_FILE.
+    :return: The opening book
     """
-    Implements the minimax algorithm with alpha-beta pruning.
-    Evaluates possible moves to find the optimal move for the current player.
+    book = dict()
+    boards = [Board()]
+    while boards:
+        board = boards.pop()
+        key = min(board.hash, board.mirror_hash)
+        if key in book:
+            continue
+        disks_count = board.mask.bit_count()
+        player = disks_count % 2 + 1
+        move_queue = Queue()
+        alpha_beta_decision(board, disks_count, BOOK_DEPTH, move_queue,
+                            player)
+        move = move_queue.get()
+        book[key] = move if key == board.hash else 6 - move
+        if disks_count + 1 < BOOK_DISKS:
+            for move in board.get_possible_moves():
+                child_board = board.copy()
+                if not child_board.add_disk(move, player,
+                                            update_display=False):
+                    boards.append(child_board)
+    with open(BOOK_FILE, 'wb') as book_file:
+        pickle.dump(book, book_file)
+    return book
+
+
+def load_opening_book():
+    """
+    Loads the opening book saved by build_opening_book.
+    :return: The opening book, empty if it has not been built
+    """
+    if not os.path.exists(BOOK_FILE):
+        return dict()
+    with open(BOOK_FILE, 'rb') as book_file:
+        return pickle.load(book_file)
+
+
+def root_parallel_search(board, depth, alpha, beta, player, pv_move):
+    """
+    Searches the possible moves in separate processes, so that the search
+    uses several CPU cores (young brothers wait): the best move of the
+    previous depth is searched first in this process, then the other moves
+    are searched in parallel with a null window only proving that they are
+    not better, and those which are better are searched again here.
+    Each process keeps its own transposition table: the results of the
+    parallel searches are only bounds, they are not brought back in the
+    table of this process (which keeps the searches of the previous depths).
     :param board: The game board
-    :param turn: Current turn number
     :param depth: Depth of the search
     :param alpha: Alpha value for pruning
     :param beta: Beta value for pruning
-    :param current_player: The player whose move is being calculated
-    :param maximizing_player: Boolean indicating if it's the maximizing player
+    :param player: The player whose turn it is
+    :param pv_move: Best move of the previous depth
     :return: A tuple of the best score and the corresponding move
     """
-    if len(board.get_possible_moves()) == 1:  # Full board -> we evaluate
-        # the board and return the only possible move
-        return board.eval(current_player), board.get_possible_moves()[0]
+    global search_pool
+    possible_moves = board.get_possible_moves()
+    if len(possible_moves) == 1 or pv_move not in possible_moves:
+        return negamax(board, depth, alpha, beta, player, pv_move)
+    _, best_value = search_after(board.copy(), pv_move, depth - 1, alpha,
+                                 beta, player)
+    best_move = pv_move
+    alpha = max(alpha, best_value)
+    if beta <= alpha:  # Cutoff
+        return best_value, best_move
+
+    if search_pool is None:
+        # Spawned processes only import the functions of this file (the
+        # game window is created in the main process only)
+        search_pool = ProcessPoolExecutor(
+            max_workers=search_workers,
+            mp_context=multiprocessing.get_context('spawn'))
+    scout_alpha = alpha
+    searches = [search_pool.submit(search_after, board, move, depth - 1,
+                                   scout_alpha, scout_alpha + 1, player)
+                for move in possible_moves if move != pv_move]
+    for search in searches:  # In the center-out order for equal scores
+        move, value = search.result()
+        if scout_alpha < value <= alpha:  # Better than the scout bound but
+            # alpha has been raised since -> null window test against alpha
+            _, value = search_after(board.copy(), move, depth - 1, alpha,
+                                    alpha + 1, player)
+        if alpha < value < beta:  # Better move -> exact value needed
+            _, value = search_after(board.copy(), move, depth - 1, alpha,
+                                    beta, player)
+        if value > best_value:
+            best_value = value
+            best_move = move
+        alpha = max(alpha, value)
+        if beta <= alpha:  # Cutoff -> the remaining scouts are not needed
+            for remaining_search in searches:
+                remaining_search.cancel()
+            break
+    return best_value, best_move
+
+
+def search_after(board, move, depth, alpha, beta, player):
+    """
+    Plays a move on the board and searches the resulting board (run in a
+    worker process by the root-parallel search).
+    :param board: The game board
+    :param move: Column index of the move to play
+    :param depth: Depth of the search after the move
+    :param alpha: Alpha value for pruning (for the player making the move)
+    :param beta: Beta value for pruning (for the player making the move)
+    :param player: The player making the move
+    :return: A tuple of the move and its score for the player
+    """
+    if board.add_disk(move, player, update_display=False):  # Victory
+        return move, board.eval(player)
+    return move, -negamax(board, depth, -beta, -alpha, 3 - player)[0]
 
-    if depth == 0 or board.check_victory():  # Victory or max
-        # depth reached -> we evaluate the board
-        return board.eval(current_player), None
 
+def negamax(board, depth, alpha, beta, player, pv_move=None):
+    """
+    Implements the negamax form of the minimax algorithm with alpha-beta
+    pruning and principal variation search: the first move is searched with
+    the full window, the other ones with a null window only proving that they
+    are not better (and searched again with the full window if they are).
+    :param board: The game board
+    :param depth: Depth of the search
+    :param alpha: Alpha value for pruning
+    :param beta: Beta value for pruning
+    :param player: The player whose turn it is (scores are given from this
+    player's point of view)
+    :param pv_move: Move to explore first (best move of a previous search)
+    :return: A tuple of the best score and the corresponding move
+    """
     possible_moves = board.get_possible_moves()
-    best_move = None
-
-    if maximizing_player:
-        max_value = float('-inf')
-        for move in possible_moves:
-            child_board = board.copy()
-            child_board.add_disk(move, current_player, update_display=False)
-            value, _ = alpha_beta(child_board, turn, depth - 1, alpha, beta,
-                                  current_player, False)
-            if value > max_value:
-                max_value = value
-                best_move = move
+    if len(possible_moves) == 1:  # Full board -> we evaluate
+        # the board and return the only possible move
+        return board.eval(player), possible_moves[0]
+
+    if depth == 0:  # Max depth reached -> we evaluate the board
+        return board.eval(player), None
+
+    key = min(board.hash, board.mirror_hash)
+    mirrored = key != board.hash
+    entry = lookup_position(key, mirrored)
+    if entry is not None and entry[0] >= depth:  # Already searched at least
+        # as deep -> we use the stored value or bound
+        _, flag, value, move = entry
+        if flag == EXACT:
+            return value, move
+        if flag == LOWER_BOUND:
             alpha = max(alpha, value)
-            if beta <= alpha:
-                break  # Beta cutoff
-        return max_value, best_move
-    else:
-        min_value = float('inf')
-        for move in possible_moves:
-            child_board = board.copy()
-            opponent_player = 3 - current_player
-            child_board.add_disk(move, opponent_player, update_display=False)
-            value, _ = alpha_beta(child_board, turn, depth - 1, alpha, beta,
-                                  current_player, True)
-            if value < min_value:
-                min_value = value
-                best_move = move
+        else:
             beta = min(beta, value)
-            if beta <= alpha:
-                break  # Alpha cutoff
-        return min_value, best_move
+        if beta <= alpha:
+            return value, move
+    alpha_origin, beta_origin = alpha, beta
+
+    # Moves are explored by decreasing history score, except the last move
+    # which caused a cutoff at this depth and, before all, the best move
+    ply = board.mask.bit_count()
+    if pv_move is None and entry is not None:
+        pv_move = entry[3]  # Best move of a previous search of this position
+    possible_moves.sort(key=history[player - 1].__getitem__, reverse=True)
+    for first_move in (killer_moves[ply], pv_move):
+        if first_move in possible_moves:
+            possible_moves.remove(first_move)
+            possible_moves.insert(0, first_move)
+
+    if depth >= 2:  # Enhanced transposition cutoff: a child already in the
+        # table may be enough to prove a cutoff without exploring any child
+        player_keys = ZOBRIST[player - 1]
+        for move in possible_moves:
+            box = board.heights[move]
+            child_entry = lookup_position(min(
+                board.hash ^ player_keys[box],
+                board.mirror_hash ^ player_keys[MIRROR_BOXES[box]]), False)
+            if (child_entry is not None and child_entry[0] >= depth - 1
+                    and child_entry[1] != LOWER_BOUND
+                    and -child_entry[2] >= beta):
+                store_position(key, mirrored, depth, LOWER_BOUND,
+                               -child_entry[2], move)
+                return -child_entry[2], move
+
+    opponent = 3 - player
+    best_value = float('-inf')
+    best_move = None
+    for move in possible_moves:
+        if board.add_disk(move, player, update_display=False):  # Victory ->
+            # we evaluate the board without searching deeper
+            value = board.eval(player)
+        elif best_move is None:
+            value = -negamax(board, depth - 1, -beta, -alpha, opponent)[0]
+        else:
+            value = -negamax(board, depth - 1, -alpha - 1, -alpha,
+                             opponent)[0]
+            if alpha < value < beta:  # Better move -> exact value needed
+                value = -negamax(board, depth - 1, -beta, -alpha,
+                                 opponent)[0]
+        board.undo_disk(move)
+        if value > best_value:
+            best_value = value
+            best_move = move
+        alpha = max(alpha, value)
+        if beta <= alpha:  # Cutoff
+            history[player - 1][move] += depth * depth
+            killer_moves[ply] = move
+            break
+
+    # Values outside the searched window are only bounds of the real value
+    if best_value <= alpha_origin:
+        flag = UPPER_BOUND
+    elif best_value >= beta_origin:
+        flag = LOWER_BOUND
+    else:
+        flag = EXACT
+    store_position(key, mirrored, depth, flag, best_value, best_move)
+    return best_value, best_move
+
+
+def lookup_position(key, mirrored):
+    """
+    Gets the transposition table entry of a board.
+    :param key: Transposition table key of the board
+    :param mirrored: Boolean indicating if the key is the board's mirror hash
+    :return: The (depth, flag, value, best_move) entry, or None if the board
+    is not in the table
+    """
+    slot = (key & (TT_BUCKETS - 1)) * 2
+    if tt_keys[slot] != key:
+        slot += 1  # Not in the depth-preferred slot -> last search slot
+        if tt_keys[slot] != key:
+            return None
+    packed = tt_entries[slot]
+    if not packed:  # Empty slot (the key of the empty board is 0)
+        return None
+    best_move = packed >> 8 & 0b1111
+    if best_move == NO_MOVE:
+        best_move = None
+    elif mirrored:
+        best_move = 6 - best_move
+    return (packed & 0b111111, packed >> 6 & 0b11, (packed >> 12) - (1 << 31),
+            best_move)
+
+
+def store_position(key, mirrored, depth, flag, value, best_move):
+    """
+    Stores the result of the search of a board in the transposition table.
+    :param key: Transposition table key of the board
+    :param mirrored: Boolean indicating if the key is the board's mirror hash
+    :param depth: Depth of the search
+    :param flag: EXACT, LOWER_BOUND or UPPER_BOUND
+    :param value: Score of the board (or bound of the score)
+    :param best_move: Best move found for the board
+    """
+    if best_move is None:
+        best_move = NO_MOVE
+    elif mirrored:
+        best_move = 6 - best_move
+    slot = (key & (TT_BUCKETS - 1)) * 2
+    if tt_keys[slot] != key and depth < tt_entries[slot] & 0b111111:
+        slot += 1  # A deeper search of another board is kept
+    tt_keys[slot] = key
+    tt_entries[slot] = ((value + (1 << 31)) << 12 | best_move << 8
+                        | flag << 6 | depth)
 
 
 class Board:
     """
     Class representing the Connect 4 board. Handles game logic, board state,
     and evaluation functions.
+    The board is stored as two bitboards: mask holds every disk on the board
+    and position holds the disks of player 1 (player 2's disks are
+    position ^ mask).
     """
-    grid = np.zeros((7, 6), dtype=int)
+    def __init__(self):
+        self.mask = 0
+        self.position = 0
+        self.hash = 0  # Zobrist hash of the disks on the board
+        self.mirror_hash = 0  # Zobrist hash of the mirrored board
+        # Index of the next free bit of each column
+        self.heights = [column * 7 for column in range(7)]
+
+    @staticmethod
+    def alignment(bitboard):
+        """
+        Checks if a bitboard contains 4 aligned disks.
+        :param bitboard: The bitboard of one player's disks
+        :return: True if 4 disks are aligned, False otherwise
+        """
+        # Horizontal, vertical, first diagonal and second diagonal
+        for shift in (7, 1, 8, 6):
+            pairs = bitboard & (bitboard >> shift)
+            if pairs & (pairs >> 2 * shift):
+                return True
+        return False
 
-    def eval_window(self, window, player):
+    def player_disks(self, player):
         """
-        Gives a score for a set of 4 boxs (based on the number of pawns
-        of the current player, of the opponent and the number of free boxs)
-        :param window: A set of 4 boxs
-        :param player: The player for whom the board is being evaluated
-        :return: The score of the set of boxs
-        """
-        opponent = 3 - player
-        if window.count(player) == 4:
-            return 10000  # Victory -> must be high so that it cannot be
-            # overtaken by another no-win combination
-        if window.count(opponent) == 4:
-            return -10000  # Defeat -> must be high so that it cannot be
-            # overtaken by another no-win combination
-        if window.count(player) == 3 and window.count(0) == 1:
-            return 20  # One pawn until victory
-        if window.count(opponent) == 3 and window.count(0) == 1:
-            return -20  # One pawn until opponent's victory
-        return 0
+        Gives the bitboard of the disks of a player.
+        :param player: The player whose disks are wanted
+        :return: The bitboard of the player's disks
+        """
+        if player == 1:
+            return self.position
+        return self.position ^ self.mask
 
     def eval(self, player):
         """
@@ -120,60 +530,10 @@ class Board:
         :param player: The player for whom the board is being evaluated
         :return: An integer score representing the board state
         """
-        # Evaluation table for the central positioning of pawns
-        evaluation_table = np.array([
-            [3, 4, 5, 7, 5, 4, 3],
-            [4, 6, 8, 10, 8, 6, 4],
-            [5, 8, 11, 13, 11, 8, 5],
-            [5, 8, 11, 13, 11, 8, 5],
-            [4, 6, 8, 10, 8, 6, 4],
-            [3, 4, 5, 7, 5, 4, 3]
-        ])
-
-        score = 0
-        opponent = 3 - player
-
-        # -> Main evaluation criteria : the AI is encouraged to line up 4
-        # pawns or 3 pawns and an empty square (and prevent the opponent from
-        # doing the same)
-
-        # Horizontal alignment
-        for row in range(6):
-            for col in range(4):
-                window = list(self.grid[col:col + 4, row])
-                score += self.eval_window(window, player)
-
-        # Vertical alignment
-        for col in range(7):
-            for row in range(3):
-                window = list(self.grid[col, row:row + 4])
-                score += self.eval_window(window, player)
-
-        # First diagonal alignment
-        for col in range(4):
-            for row in range(3):
-                window = [self.grid[col + i][row + i] for i in range(4)]
-                score += self.eval_window(window, player)
-
-        # Second diagonal alignment
-        for col in range(4):
-            for row in range(3, 6):
-                window = [self.grid[col + i][row - i] for i in range(4)]
-                score += self.eval_window(window, player)
-
-        # -> Then, to help decide between 2 moves who give the same number of
-        # alignments, we encourage central positioning (more chance to align
-        # pawns)
-
-        # Central positioning
-        for row in range(6):
-            for col in range(7):
-                if self.grid[col][row] == player:
-                    score += evaluation_table[row][col]
-                elif self.grid[col][row] == opponent:
-                    score -= evaluation_table[row][col]
-
-        return score
+        mask = self.mask
+        player_disks = self.position if player == 1 else self.position ^ mask
+        return eval_bitboards(player_disks, player_disks ^ mask,
+                              BOARD_MASK & ~mask)
 
     def copy(self):
         """
@@ -181,14 +541,22 @@ class Board:
         :return: A new Board instance with the same state
         """
         new_board = Board()
-        new_board.grid = self.grid.copy()
+        new_board.mask = self.mask
+        new_board.position = self.position
+        new_board.hash = self.hash
+        new_board.mirror_hash = self.mirror_hash
+        new_board.heights = self.heights[:]
         return new_board
 
     def reinit(self):
         """
         Resets the board to its initial state and updates the display.
         """
-        self.grid.fill(0)
+        self.mask = 0
+        self.position = 0
+        self.hash = 0
+        self.mirror_hash = 0
+        self.heights = [column * 7 for column in range(7)]
         for i in range(7):
             for j in range(6):
                 canvas1.itemconfig(disks[i][j], fill=disk_color[0])
@@ -196,17 +564,11 @@ class Board:
     def get_possible_moves(self):
         """
         Determines the list of valid columns where a disk can be added.
-        :return: List of column indices
-        """
-        possible_moves = list()
-        if self.grid[3][5] == 0:
-            possible_moves.append(3)
-        for shift_from_center in range(1, 4):
-            if self.grid[3 + shift_from_center][5] == 0:
-                possible_moves.append(3 + shift_from_center)
-            if self.grid[3 - shift_from_center][5] == 0:
-                possible_moves.append(3 - shift_from_center)
-        return possible_moves
+        :return: List of column indices, from the center to the edges
+        """
+        playable = (self.mask + BOTTOM_MASK) & BOARD_MASK
+        return [column for column in CENTER_OUT_COLUMNS
+                if playable & COLUMN_MASKS[column]]
 
     def add_disk(self, column, player, update_display=True):
         """
@@ -214,13 +576,34 @@ class Board:
         :param column: Column index where the disk should be placed
         :param player: The player making the move
         :param update_display: Boolean to update the graphical display
+        :return: True if the disk gives the victory to the player
         """
-        for j in range(6):
-            if self.grid[column][j] == 0:
-                self.grid[column][j] = player
-                break
+        move = 1 << self.heights[column]
+        self.mask |= move
+        if player == 1:
+            self.position |= move
+        self.hash ^= ZOBRIST[player - 1][self.heights[column]]
+        self.mirror_hash ^= ZOBRIST[player - 1][
+            MIRROR_BOXES[self.heights[column]]]
+        row = self.heights[column] - column * 7
+        self.heights[column] += 1
         if update_display:
-            canvas1.itemconfig(disks[column][j], fill=disk_color[player])
+            canvas1.itemconfig(disks[column][row], fill=disk_color[player])
+        return self.check_victory_at(column, row, player)
+
+    def undo_disk(self, column):
+        """
+        Removes the last disk added to the specified column.
+        :param column: Column index of the disk to remove
+        """
+        self.heights[column] -= 1
+        move = 1 << self.heights[column]
+        player = 1 if self.position & move else 2
+        self.hash ^= ZOBRIST[player - 1][self.heights[column]]
+        self.mirror_hash ^= ZOBRIST[player - 1][
+            MIRROR_BOXES[self.heights[column]]]
+        self.mask ^= move
+        self.position &= ~move
 
     def column_filled(self, column):
         """
@@ -228,47 +611,30 @@ class Board:
         :param column: Column index
         :return: True if the column is full, False otherwise
         """
-        return self.grid[column][5] != 0
+        return self.heights[column] == column * 7 + 6
+
+    def check_victory_at(self, column, row, player):
+        """
+        Checks if the disk of a box is part of 4 aligned disks of a player
+        (only the last added disk can have created a new alignment).
+        :param column: Column index of the box
+        :param row: Row index of the box
+        :param player: The player owning the disk
+        :return: True if the disk is part of 4 aligned disks, False otherwise
+        """
+        player_disks = self.player_disks(player)
+        for window in WINDOWS_BY_BOX[column * 7 + row]:
+            if player_disks & window == window:
+                return True
+        return False
 
     def check_victory(self):
         """
         Checks if there is a victory condition on the board.
         :return: True if a player has won, False otherwise
         """
-        # Horizontal alignment check
-        for line in range(6):
-            for horizontal_shift in range(4):
-                if (self.grid[horizontal_shift][line]
-                        == self.grid[horizontal_shift + 1][line]
-                        == self.grid[horizontal_shift + 2][line]
-                        == self.grid[horizontal_shift + 3][line]
-                        != 0):
-                    return True
-        # Vertical alignment check
-        for column in range(7):
-            for vertical_shift in range(3):
-                if (self.grid[column][vertical_shift]
-                        == self.grid[column][vertical_shift + 1]
-                        == self.grid[column][vertical_shift + 2]
-                        == self.grid[column][vertical_shift + 3]
-                        != 0):
-                    return True
-        # Diagonal alignment check
-        for horizontal_shift in range(4):
-            for vertical_shift in range(3):
-                if (self.grid[horizontal_shift][vertical_shift]
-                        == self.grid[horizontal_shift + 1][vertical_shift + 1]
-                        == self.grid[horizontal_shift + 2][vertical_shift + 2]
-                        == self.grid[horizontal_shift + 3][vertical_shift + 3]
-                        != 0):
-                    return True
-                elif (self.grid[horizontal_shift][5 - vertical_shift]
-                      == self.grid[horizontal_shift + 1][4 - vertical_shift]
-                      == self.grid[horizontal_shift + 2][3 - vertical_shift]
-                      == self.grid[horizontal_shift + 3][2 - vertical_shift]
-                      != 0):
-                    return True
-        return False
+        return (self.alignment(self.position)
+                or self.alignment(self.position ^ self.mask))
 
 
 class Connect4:
@@ -364,57 +730,63 @@ class Connect4:
             self.human_turn = True
 
 
-game = Connect4()
+if __name__ == '__main__':
+    if '--build-book' in sys.argv:
+        build_opening_book()
+        sys.exit()
+    opening_book = load_opening_book()
 
-# Graphical settings
-width = 700
-row_width = width // 7
-row_height = row_width
-height = row_width * 6
-row_margin = row_height // 10
+    game = Connect4()
 
-window = tk.Tk()
-window.title("Connect 4")
-canvas1 = tk.Canvas(window, bg="blue", width=width, height=height)
+    # Graphical settings
+    width = 700
+    row_width = width // 7
+    row_height = row_width
+    height = row_width * 6
+    row_margin = row_height // 10
 
-# Drawing the grid
-for i in range(7):
-    disks.append(list())
-    for j in range(5, -1, -1):
-        disks[i].append(canvas1.create_oval(row_margin + i * row_width,
-                                            row_margin + j * row_height,
-                                            (i + 1) * row_width - row_margin,
-                                            (j + 1) * row_height - row_margin,
-                                            fill='white'))
+    window = tk.Tk()
+    window.title("Connect 4")
+    canvas1 = tk.Canvas(window, bg="blue", width=width, height=height)
 
+    # Drawing the grid
+    for i in range(7):
+        disks.append(list())
+        for j in range(5, -1, -1):
+            disks[i].append(canvas1.create_oval(
+                row_margin + i * row_width,
+                row_margin + j * row_height,
+                (i + 1) * row_width - row_margin,
+                (j + 1) * row_height - row_margin,
+                fill='white'))
 
-canvas1.grid(row=0, column=0, columnspan=2)
+    canvas1.grid(row=0, column=0, columnspan=2)
 
-information = tk.Label(window, text="")
-information.grid(row=1, column=0, columnspan=2)
+    information = tk.Label(window, text="")
+    information.grid(row=1, column=0, columnspan=2)
 
-label_player1 = tk.Label(window, text="Player 1: ")
-label_player1.grid(row=2, column=0)
-combobox_player1 = ttk.Combobox(window, state='readonly')
-combobox_player1.grid(row=2, column=1)
+    label_player1 = tk.Label(window, text="Player 1: ")
+    label_player1.grid(row=2, column=0)
+    combobox_player1 = ttk.Combobox(window, state='readonly')
+    combobox_player1.grid(row=2, column=1)
 
-label_player2 = tk.Label(window, text="Player 2: ")
-label_player2.grid(row=3, column=0)
-combobox_player2 = ttk.Combobox(window, state='readonly')
-combobox_player2.grid(row=3, column=1)
+    label_player2 = tk.Label(window, text="Player 2: ")
+    label_player2.grid(row=3, column=0)
+    combobox_player2 = ttk.Combobox(window, state='readonly')
+    combobox_player2.grid(row=3, column=1)
 
-combobox_player1['values'] = player_type
-combobox_player1.current(0)
-combobox_player2['values'] = player_type
-combobox_player2.current(6)
+    combobox_player1['values'] = player_type
+    combobox_player1.current(0)
+    combobox_player2['values'] = player_type
+    combobox_player2.current(6)
 
-button2 = tk.Button(window, text='New game', command=game.launch)
-button2.grid(row=4, column=0)
+    button2 = tk.Button(window, text='New game', command=game.launch)
+    button2.grid(row=4, column=0)
 
-button = tk.Button(window, text='Quit', command=window.destroy)
-button.grid(row=4, column=1)
+    button = tk.Button(window, text='Quit', command=window.destroy)
+    button.grid(row=4, column=1)
 
-# Mouse handling
-canvas1.bind('<Button-1>', game.click)
+    # Mouse handling
+    canvas1.bind('<Button-1>', game.click)
 
-window.mainloop()
+    window.mainloop()